@@ -1,4 +1,9 @@
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import httpx
 from groq import Groq
 from dotenv import load_dotenv
 from typing import Dict, List
@@ -6,29 +11,52 @@ from database import TurfBookingDatabase
 from datetime import datetime, timedelta
 import json
 
-# Load environment variables
-load_dotenv()
+# .env is read on first client use rather than at import, so importing
+# this module (and starting WSGI workers) stays fast.
+_env_loaded = False
 
-class TurfBookingAgent:
-    """AI-powered booking agent using Groq API"""
-    
-    def __init__(self):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        self.db = TurfBookingDatabase()
-        self.db.initialize_dummy_turf()
-        self.conversation_history = []
-        self.model = "llama-3.3-70b-versatile"
-    
-    def get_system_prompt(self) -> str:
-        """Get the system prompt for the AI agent"""
-        turfs = self.db.get_all_turfs()
-        turf_info = json.dumps(turfs, indent=2)
-        
-        return f"""You are a professional and friendly turf booking assistant for sports facility reservations. 
-Your name is "BookMyTurf Assistant" and you help customers book turfs for sports activities.
+def _load_env_once():
+    global _env_loaded
+    if not _env_loaded:
+        load_dotenv()
+        _env_loaded = True
+
+# Response cache tuning: repeat queries within the TTL skip the Groq
+# round trip entirely; the cache is keyed on DB versions so any booking
+# or turf change invalidates stale answers.
+RESPONSE_CACHE_MAX_ENTRIES = 128
+RESPONSE_CACHE_TTL_SECONDS = 60
+
+# History compaction: once the committed history is estimated to exceed
+# the token budget, older turns are summarized into a single system note
+# so prompt cost stays bounded no matter how long the chat runs.
+HISTORY_TOKEN_BUDGET = 2000
+HISTORY_KEEP_RECENT_MESSAGES = 4
+
+# Cap on tool-call round trips per user turn, to bound latency and
+# guard against the model looping on a failing tool.
+MAX_TOOL_ROUNDS = 5
+
+# Special commands matched in one pass over the message; the matched
+# phrase dispatches through the handler table below. Add new commands by
+# extending both the pattern and the table.
+_COMMAND_RE = re.compile(
+    r"check availability|available slots|show bookings|view bookings|my bookings",
+    re.IGNORECASE
+)
+_COMMAND_HANDLERS = {
+    "check availability": "_get_availability_info",
+    "available slots": "_get_availability_info",
+    "show bookings": "_get_all_bookings_info",
+    "view bookings": "_get_all_bookings_info",
+    "my bookings": "_get_all_bookings_info",
+}
 
-Available Turfs:
-{turf_info}
+# Immutable role/policy block, sent as message index 0 on every call.
+# Everything that can change lives in the catalog context or the user
+# turn, so this prefix never varies and stays cacheable byte-for-byte.
+STATIC_SYSTEM_PROMPT = """You are a professional and friendly turf booking assistant for sports facility reservations.
+Your name is "BookMyTurf Assistant" and you help customers book turfs for sports activities.
 
 Your capabilities:
 1. Provide information about available turfs, their amenities, and pricing
@@ -37,6 +65,10 @@ Your capabilities:
 4. Handle booking cancellations
 5. Answer questions about facilities, pricing, and policies
 
+Use the provided tools to look up turf details, check slot availability,
+create bookings, and cancel bookings. Never guess turf data or availability
+from memory — always call the matching tool.
+
 Guidelines:
 - Be friendly, professional, and helpful
 - Ask for required information politely: customer name, phone number, preferred date, and time slot
@@ -61,66 +93,453 @@ For cancellations:
 
 Always be conversational and natural in your responses."""
 
+# Booking operations exposed to the model as function tools. Turf data
+# flows into the context only when the model actually asks for it,
+# keeping the system prompt small and byte-stable.
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_turfs",
+            "description": "Get the full list of turfs with location, amenities, pricing, available hours and ratings",
+            "parameters": {"type": "object", "properties": {}, "required": []}
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "check_availability",
+            "description": "Check whether a specific time slot is free for a turf on a date",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "turf_id": {"type": "string", "description": "Turf ID, e.g. turf_001"},
+                    "date": {"type": "string", "description": "Date in YYYY-MM-DD format"},
+                    "time_slot": {"type": "string", "description": "Time slot in HH:00 24-hour format"}
+                },
+                "required": ["turf_id", "date", "time_slot"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "create_booking",
+            "description": "Create a confirmed booking once all details are collected and confirmed with the customer",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "turf_id": {"type": "string", "description": "Turf ID, e.g. turf_001"},
+                    "customer_name": {"type": "string"},
+                    "customer_phone": {"type": "string"},
+                    "customer_email": {"type": "string"},
+                    "date": {"type": "string", "description": "Date in YYYY-MM-DD format"},
+                    "time_slot": {"type": "string", "description": "Time slot in HH:00 24-hour format"},
+                    "duration": {"type": "integer", "description": "Duration in hours, default 1"}
+                },
+                "required": ["turf_id", "customer_name", "customer_phone", "date", "time_slot"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "cancel_booking",
+            "description": "Cancel an existing booking by its booking ID",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "booking_id": {"type": "string", "description": "Booking ID, e.g. BK000001"}
+                },
+                "required": ["booking_id"]
+            }
+        }
+    }
+]
+
+# One process-wide HTTP client so every agent shares a keep-alive
+# connection pool to Groq instead of paying a TLS handshake per call.
+_http_client = None
+
+def _get_http_client() -> httpx.Client:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            timeout=30.0,
+        )
+    return _http_client
+
+class TurfBookingAgent:
+    """AI-powered booking agent using Groq API"""
+    
+    def __init__(self, db: TurfBookingDatabase = None):
+        self._client = None
+        self.db = db if db is not None else TurfBookingDatabase()
+        self.db.initialize_dummy_turf()
+        # Serializes chat processing for this agent; conversation state
+        # is per-session, but Flask may thread concurrent requests.
+        self.lock = threading.Lock()
+        self.model = "llama-3.3-70b-versatile"
+        self._turfs_version = len(self.db.get_all_turfs())
+        # Committed history only grows at the tail; past entries are never
+        # mutated or sliced, so the prompt prefix stays byte-identical
+        # across turns and can hit Groq's prefix cache.
+        self.static_system = STATIC_SYSTEM_PROMPT
+        self._catalog_prompt = self._render_catalog_context()
+        # The one messages buffer for this session: system blocks at
+        # indexes 0-1, then the conversation. Turns (including tool
+        # rounds) are appended in place, never rebuilt, so entry object
+        # identity is stable and token counts are tracked per entry in
+        # the parallel _token_counts list.
+        self._messages = self._system_messages()
+        self._token_counts = [self._estimate_tokens(m) for m in self._messages]
+        self.committed_summary = ""
+        self._response_cache = OrderedDict()
+
+    @property
+    def client(self) -> Groq:
+        """Lazily build the Groq client on first use"""
+        if self._client is None:
+            _load_env_once()
+            self._client = Groq(
+                api_key=os.getenv("GROQ_API_KEY"),
+                http_client=_get_http_client(),
+            )
+        return self._client
+
+    def get_system_prompt(self) -> str:
+        """Get the full system context (static block plus turf catalog)"""
+        return f"{self.static_system}\n\n{self._catalog_context()}"
+
+    def _catalog_context(self) -> str:
+        """Get the cached catalog block, rebuilding it only if the turfs changed"""
+        current_version = len(self.db.get_all_turfs())
+        if self._catalog_prompt is None or current_version != self._turfs_version:
+            self._turfs_version = current_version
+            self._catalog_prompt = self._render_catalog_context()
+        return self._catalog_prompt
+
+    def invalidate_system_prompt(self):
+        """Force the catalog block to be rebuilt on next use (call after turf changes)"""
+        self._catalog_prompt = None
+
+    def _render_catalog_context(self) -> str:
+        """Render a compact turf summary (full details come from get_turfs)"""
+        lines = ["Turf catalog (call get_turfs for full details):"]
+        for turf in self.db.get_all_turfs():
+            hours = turf["available_hours"]
+            lines.append(
+                f"- {turf['id']}: {turf['name']}, {turf['location']} — "
+                f"₹{turf['price_per_hour']}/hour, slots {hours[0]}-{hours[-1]}"
+            )
+        return "\n".join(lines)
+
+    def _system_messages(self) -> List[Dict]:
+        """Build the two system blocks: immutable prefix, then catalog"""
+        return [
+            {"role": "system", "content": self.static_system},
+            {"role": "system", "content": self._catalog_context()}
+        ]
+
+    def _append_message(self, message: Dict):
+        """Append to the messages buffer, keeping token counts in step"""
+        self._messages.append(message)
+        self._token_counts.append(self._estimate_tokens(message))
+
+    def _refresh_catalog_message(self):
+        """Update the catalog block in place if the turfs changed"""
+        content = self._catalog_context()
+        if self._messages[1]["content"] != content:
+            self._messages[1] = {"role": "system", "content": content}
+            self._token_counts[1] = self._estimate_tokens(self._messages[1])
+
     def process_message(self, user_message: str) -> str:
         """Process user message and generate response"""
-        # Add user message to history
-        self.conversation_history.append({
-            "role": "user",
-            "content": user_message
-        })
-        
         # Check if user wants to perform specific actions
         response = self._handle_special_commands(user_message)
         if response:
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": response
-            })
+            self._commit_turn(user_message, response)
             return response
-        
-        # Get AI response
+
+        # Serve repeat queries from the response cache
+        cache_key = self._response_cache_key(user_message)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            self._commit_turn(user_message, cached)
+            return cached
+
+        # Get AI response. The buffer already holds the stable prefix
+        # (system blocks plus committed turns); just append the new
+        # user turn in place — no per-turn list rebuild.
+        self._refresh_catalog_message()
+        self._append_message({"role": "user", "content": user_message})
         try:
-            messages = [
-                {"role": "system", "content": self.get_system_prompt()}
-            ] + self.conversation_history[-10:]  # Keep last 10 messages for context
-            
+            ai_response = self._run_tool_loop()
+            self._cache_put(cache_key, ai_response)
+            self._append_message({"role": "assistant", "content": ai_response})
+            self._maybe_compact_history()
+
+            return ai_response
+
+        except Exception as e:
+            error_message = f"I apologize, but I encountered an error: {str(e)}. Please try again."
+            self._append_message({"role": "assistant", "content": error_message})
+            self._maybe_compact_history()
+            return error_message
+
+    def process_message_stream(self, user_message: str):
+        """Process user message, yielding response text as it arrives
+
+        Special-command and cached responses are yielded in one piece;
+        Groq responses are streamed token-by-token so the UI can render
+        text as soon as the first chunk lands. The full response is
+        still committed to history once the stream completes.
+        """
+        response = self._handle_special_commands(user_message)
+        if response:
+            self._commit_turn(user_message, response)
+            yield response
+            return
+
+        cache_key = self._response_cache_key(user_message)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            self._commit_turn(user_message, cached)
+            yield cached
+            return
+
+        self._refresh_catalog_message()
+        self._append_message({"role": "user", "content": user_message})
+        try:
+            parts = []
+            for round_num in range(MAX_TOOL_ROUNDS):
+                stream = self.client.chat.completions.create(
+                    messages=self._messages,
+                    model=self.model,
+                    temperature=0.7,
+                    max_tokens=1024,
+                    tools=TOOLS,
+                    stream=True,
+                )
+
+                tool_calls = {}
+                for chunk in stream:
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        parts.append(delta.content)
+                        yield delta.content
+                    for tc in (delta.tool_calls or []):
+                        entry = tool_calls.setdefault(tc.index, {"id": "", "name": "", "arguments": ""})
+                        if tc.id:
+                            entry["id"] = tc.id
+                        if tc.function and tc.function.name:
+                            entry["name"] = tc.function.name
+                        if tc.function and tc.function.arguments:
+                            entry["arguments"] += tc.function.arguments
+
+                if not tool_calls:
+                    break
+                self._append_tool_round(
+                    [(e["id"], e["name"], e["arguments"]) for _, e in sorted(tool_calls.items())]
+                )
+
+            ai_response = "".join(parts)
+            self._cache_put(cache_key, ai_response)
+            self._append_message({"role": "assistant", "content": ai_response})
+            self._maybe_compact_history()
+
+        except Exception as e:
+            error_message = f"I apologize, but I encountered an error: {str(e)}. Please try again."
+            self._append_message({"role": "assistant", "content": error_message})
+            self._maybe_compact_history()
+            yield error_message
+
+    def _run_tool_loop(self) -> str:
+        """Call Groq with tools, dispatching tool calls until text comes back"""
+        for round_num in range(MAX_TOOL_ROUNDS):
             chat_completion = self.client.chat.completions.create(
-                messages=messages,
+                messages=self._messages,
                 model=self.model,
                 temperature=0.7,
                 max_tokens=1024,
+                tools=TOOLS,
             )
-            
-            ai_response = chat_completion.choices[0].message.content
-            
-            # Add AI response to history
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": ai_response
-            })
-            
-            return ai_response
-            
-        except Exception as e:
-            error_message = f"I apologize, but I encountered an error: {str(e)}. Please try again."
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": error_message
+
+            message = chat_completion.choices[0].message
+            if not message.tool_calls:
+                return message.content
+            self._append_tool_round(
+                [(tc.id, tc.function.name, tc.function.arguments) for tc in message.tool_calls]
+            )
+
+        return "I'm sorry, I couldn't complete that request. Please try again."
+
+    def _append_tool_round(self, tool_calls: List[tuple]):
+        """Execute tool calls and append the assistant/tool messages in place"""
+        self._append_message({
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": call_id,
+                    "type": "function",
+                    "function": {"name": name, "arguments": arguments}
+                }
+                for call_id, name, arguments in tool_calls
+            ]
+        })
+        for call_id, name, arguments in tool_calls:
+            self._append_message({
+                "role": "tool",
+                "tool_call_id": call_id,
+                "content": self._execute_tool(name, arguments)
             })
-            return error_message
+
+    def _execute_tool(self, name: str, arguments: str) -> str:
+        """Dispatch a single tool call against the database, returning JSON"""
+        try:
+            args = json.loads(arguments) if arguments else {}
+        except json.JSONDecodeError:
+            return json.dumps({"error": "Invalid tool arguments"})
+
+        try:
+            if name == "get_turfs":
+                result = self.db.get_all_turfs()
+            elif name == "check_availability":
+                result = {
+                    "available": self.db.check_availability(
+                        args["turf_id"], args["date"], args["time_slot"]
+                    )
+                }
+            elif name == "create_booking":
+                ok, outcome = self.db.try_book(args)
+                result = outcome if ok else {"error": outcome}
+            elif name == "cancel_booking":
+                result = {"cancelled": self.db.cancel_booking(args["booking_id"])}
+            else:
+                result = {"error": f"Unknown tool: {name}"}
+        except KeyError as e:
+            result = {"error": f"Missing required argument: {e.args[0]}"}
+
+        return json.dumps(result)
+
+    def _response_cache_key(self, user_message: str) -> tuple:
+        """Build a cache key that changes whenever the answer could change"""
+        last_assistant = next(
+            (m["content"] for m in reversed(self._messages)
+             if m["role"] == "assistant" and m["content"]),
+            ""
+        )
+        return (
+            user_message.strip().lower(),
+            self._turfs_version,
+            self.db.bookings_version,
+            hash(last_assistant),
+        )
+
+    def _cache_get(self, key: tuple):
+        """Look up a fresh cached response, evicting it if expired"""
+        entry = self._response_cache.get(key)
+        if entry is None:
+            return None
+        cached_at, response = entry
+        if time.time() - cached_at > RESPONSE_CACHE_TTL_SECONDS:
+            del self._response_cache[key]
+            return None
+        self._response_cache.move_to_end(key)
+        return response
+
+    def _cache_put(self, key: tuple, response: str):
+        """Store a response, evicting the least recently used entry if full"""
+        self._response_cache[key] = (time.time(), response)
+        self._response_cache.move_to_end(key)
+        if len(self._response_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+            self._response_cache.popitem(last=False)
+
+    def _commit_turn(self, user_message: str, assistant_message: str):
+        """Append a completed user/assistant exchange to the messages buffer"""
+        self._append_message({
+            "role": "user",
+            "content": user_message
+        })
+        self._append_message({
+            "role": "assistant",
+            "content": assistant_message
+        })
+        self._maybe_compact_history()
+
+    @staticmethod
+    def _estimate_tokens(message: Dict) -> int:
+        """Rough token estimate (~4 characters per token)"""
+        return len(message.get("content") or "") // 4
+
+    def _maybe_compact_history(self):
+        """Summarize older turns once the history exceeds the token budget
+
+        This is the only place older buffer entries are replaced; it
+        resets the cacheable prefix, so it runs as rarely as the budget
+        allows and always keeps the most recent messages verbatim. The
+        system blocks at indexes 0-1 are never touched.
+        """
+        total = sum(self._token_counts[2:])
+        if total <= HISTORY_TOKEN_BUDGET:
+            return
+        if len(self._messages) - 2 <= HISTORY_KEEP_RECENT_MESSAGES:
+            return
+
+        # Don't let the kept tail open with orphaned tool results whose
+        # originating assistant message got summarized away.
+        start = len(self._messages) - HISTORY_KEEP_RECENT_MESSAGES
+        while start < len(self._messages) and self._messages[start]["role"] == "tool":
+            start += 1
+        old = self._messages[2:start]
+        if not old:
+            return
+        summary = self._summarize_turns(old)
+        if summary is None:
+            return
+
+        self.committed_summary = summary
+        summary_message = {
+            "role": "system",
+            "content": f"Prior conversation summary: {summary}"
+        }
+        self._messages[2:start] = [summary_message]
+        self._token_counts[2:start] = [self._estimate_tokens(summary_message)]
+
+    def _summarize_turns(self, turns: List[Dict]) -> str:
+        """Summarize a slice of conversation, returning None on failure"""
+        transcript = "\n".join(
+            f"{m['role']}: {m['content']}" for m in turns if m.get("content")
+        )
+        if self.committed_summary:
+            transcript = f"Earlier summary: {self.committed_summary}\n{transcript}"
+        try:
+            completion = self.client.chat.completions.create(
+                messages=[
+                    {"role": "system", "content": (
+                        "Summarize the following turf booking conversation in a few "
+                        "sentences, preserving customer name, phone number, dates, "
+                        "time slots, and booking IDs exactly as given."
+                    )},
+                    {"role": "user", "content": transcript}
+                ],
+                model=self.model,
+                temperature=0.0,
+                max_tokens=256,
+            )
+            return completion.choices[0].message.content
+        except Exception:
+            # Leave history uncompacted; the next turn will retry.
+            return None
     
     def _handle_special_commands(self, message: str) -> str:
         """Handle special commands for booking operations"""
-        message_lower = message.lower()
-        
-        # Check availability command
-        if "check availability" in message_lower or "available slots" in message_lower:
-            return self._get_availability_info()
-        
-        # View all bookings command
-        if "show bookings" in message_lower or "view bookings" in message_lower or "my bookings" in message_lower:
-            return self._get_all_bookings_info()
-        
+        match = _COMMAND_RE.search(message)
+        if match:
+            handler = _COMMAND_HANDLERS[match.group(0).lower()]
+            return getattr(self, handler)()
         return None
     
     def _get_availability_info(self) -> str:
@@ -138,9 +557,7 @@ Always be conversational and natural in your responses."""
         
         for date, date_label in [(today, "Today"), (tomorrow, "Tomorrow")]:
             info += f"**{date_label} ({date}):**\n"
-            bookings = self.db.get_bookings_for_date(turf['id'], date)
-            booked_slots = [b['time_slot'] for b in bookings if b['status'] == 'confirmed']
-            
+            booked_slots = self.db.get_booked_slots(turf['id'], date)
             available_slots = [slot for slot in turf['available_hours'] if slot not in booked_slots]
             
             if available_slots:
@@ -155,16 +572,14 @@ Always be conversational and natural in your responses."""
     
     def _get_all_bookings_info(self) -> str:
         """Get all current bookings"""
-        bookings = self.db.get_all_bookings()
-        if not bookings:
-            return "No bookings found."
-        
-        confirmed_bookings = [b for b in bookings if b['status'] == 'confirmed']
+        confirmed_bookings = self.db.get_recent_confirmed_bookings(10)
         if not confirmed_bookings:
+            if not self.db.get_all_bookings():
+                return "No bookings found."
             return "No confirmed bookings at the moment."
-        
+
         info = "**Current Bookings:**\n\n"
-        for booking in confirmed_bookings[-10:]:  # Show last 10 bookings
+        for booking in confirmed_bookings:  # Last 10 bookings, oldest first
             info += f"🎫 **Booking ID:** {booking['booking_id']}\n"
             info += f"   Customer: {booking['customer_name']}\n"
             info += f"   Date: {booking['date']} at {booking['time_slot']}\n"
@@ -1,123 +1,190 @@
-from flask import Flask, render_template, request, jsonify
-from agent import TurfBookingAgent
-from datetime import datetime
-import os
-
-app = Flask(__name__)
-agent = TurfBookingAgent()
-
-@app.route('/')
-def index():
-    """Render the main page"""
-    turfs = agent.get_turf_info()
-    return render_template('index.html', turfs=turfs)
-
-@app.route('/chat', methods=['POST'])
-def chat():
-    """Handle chat messages"""
-    try:
-        data = request.json
-        user_message = data.get('message', '')
-        
-        if not user_message:
-            return jsonify({'error': 'No message provided'}), 400
-        
-        # Process message through agent
-        response = agent.process_message(user_message)
-        
-        return jsonify({
-            'response': response,
-            'timestamp': datetime.now().strftime('%H:%M')
-        })
-    
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/turfs', methods=['GET'])
-def get_turfs():
-    """Get all turfs"""
-    turfs = agent.get_turf_info()
-    return jsonify(turfs)
-
-@app.route('/api/bookings', methods=['GET'])
-def get_bookings():
-    """Get all bookings"""
-    bookings = agent.db.get_all_bookings()
-    return jsonify(bookings)
-
-@app.route('/api/book', methods=['POST'])
-def create_booking():
-    """Create a new booking"""
-    try:
-        data = request.json
-        
-        # Validate required fields
-        required_fields = ['turf_id', 'customer_name', 'customer_phone', 'date', 'time_slot']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
-        
-        # Check availability
-        if not agent.db.check_availability(data['turf_id'], data['date'], data['time_slot']):
-            return jsonify({'error': 'This time slot is already booked'}), 400
-        
-        # Get turf info for pricing
-        turf = agent.db.get_turf_by_id(data['turf_id'])
-        if not turf:
-            return jsonify({'error': 'Turf not found'}), 404
-        
-        # Calculate total amount
-        duration = data.get('duration', 1)
-        data['total_amount'] = turf['price_per_hour'] * duration
-        
-        # Create booking
-        booking = agent.create_booking_from_details(data)
-        
-        return jsonify({
-            'success': True,
-            'booking': booking,
-            'message': 'Booking confirmed successfully!'
-        })
-    
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/cancel/<booking_id>', methods=['POST'])
-def cancel_booking(booking_id):
-    """Cancel a booking"""
-    try:
-        success = agent.cancel_booking_by_id(booking_id)
-        if success:
-            return jsonify({
-                'success': True,
-                'message': 'Booking cancelled successfully'
-            })
-        else:
-            return jsonify({'error': 'Booking not found'}), 404
-    
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/availability/<turf_id>/<date>', methods=['GET'])
-def check_availability(turf_id, date):
-    """Check availability for a specific date"""
-    try:
-        turf = agent.db.get_turf_by_id(turf_id)
-        if not turf:
-            return jsonify({'error': 'Turf not found'}), 404
-        
-        bookings = agent.db.get_bookings_for_date(turf_id, date)
-        booked_slots = [b['time_slot'] for b in bookings if b['status'] == 'confirmed']
-        available_slots = [slot for slot in turf['available_hours'] if slot not in booked_slots]
-        
-        return jsonify({
-            'available_slots': available_slots,
-            'booked_slots': booked_slots,
-            'price_per_hour': turf['price_per_hour']
-        })
-    
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context
+from agent import TurfBookingAgent, _load_env_once
+from database import TurfBookingDatabase
+from collections import OrderedDict
+from datetime import datetime
+from uuid import uuid4
+import json
+import os
+import threading
+
+try:
+    import orjson
+    from flask.json.provider import JSONProvider
+
+    class ORJSONProvider(JSONProvider):
+        """Serve jsonify responses through orjson instead of stdlib json"""
+
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj).decode("utf-8")
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+# .env holds the app's configuration (README documents it), so it has to
+# be loaded before the getenv reads below; the Groq client stays lazy.
+_load_env_once()
+
+app = Flask(__name__)
+app.secret_key = os.getenv("FLASK_SECRET_KEY") or os.urandom(24).hex()
+if orjson:
+    app.json = ORJSONProvider(app)
+
+# One shared database (the actual storage), one agent per chat session so
+# users never share conversation history. Sessions are evicted LRU-style
+# to bound memory. Set TURF_DB_BACKEND=sqlite to use the SQLite backend.
+if os.getenv('TURF_DB_BACKEND', 'json').lower() == 'sqlite':
+    from sqlite_database import SQLiteTurfBookingDatabase
+    db = SQLiteTurfBookingDatabase()
+else:
+    db = TurfBookingDatabase()
+db.initialize_dummy_turf()
+
+MAX_SESSIONS = 1000
+_agents = OrderedDict()
+_agents_lock = threading.Lock()
+
+def get_agent() -> TurfBookingAgent:
+    """Get (or create) the agent bound to this request's session"""
+    sid = session.get('sid')
+    if not sid:
+        sid = uuid4().hex
+        session['sid'] = sid
+    with _agents_lock:
+        agent = _agents.get(sid)
+        if agent is None:
+            agent = TurfBookingAgent(db=db)
+            _agents[sid] = agent
+        _agents.move_to_end(sid)
+        while len(_agents) > MAX_SESSIONS:
+            _agents.popitem(last=False)
+    return agent
+
+@app.route('/')
+def index():
+    """Render the main page"""
+    turfs = db.get_all_turfs()
+    return render_template('index.html', turfs=turfs)
+
+@app.route('/chat', methods=['POST'])
+def chat():
+    """Handle chat messages"""
+    try:
+        data = request.json
+        user_message = data.get('message', '')
+
+        if not user_message:
+            return jsonify({'error': 'No message provided'}), 400
+
+        # Process message through this session's agent
+        agent = get_agent()
+        with agent.lock:
+            response = agent.process_message(user_message)
+
+        return jsonify({
+            'response': response,
+            'timestamp': datetime.now().strftime('%H:%M')
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Handle chat messages, streaming the response as server-sent events"""
+    data = request.json
+    user_message = data.get('message', '')
+
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+
+    agent = get_agent()
+
+    def generate():
+        with agent.lock:
+            for delta in agent.process_message_stream(user_message):
+                yield f"data: {json.dumps({'delta': delta})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+@app.route('/api/turfs', methods=['GET'])
+def get_turfs():
+    """Get all turfs"""
+    turfs = db.get_all_turfs()
+    return jsonify(turfs)
+
+@app.route('/api/bookings', methods=['GET'])
+def get_bookings():
+    """Get all bookings"""
+    bookings = db.get_all_bookings()
+    return jsonify(bookings)
+
+@app.route('/api/book', methods=['POST'])
+def create_booking():
+    """Create a new booking"""
+    try:
+        data = request.json
+        
+        # Validate required fields
+        required_fields = ['turf_id', 'customer_name', 'customer_phone', 'date', 'time_slot']
+        for field in required_fields:
+            if field not in data:
+                return jsonify({'error': f'Missing required field: {field}'}), 400
+        
+        # Validate, price and create atomically
+        ok, result = db.try_book(data)
+        if not ok:
+            status = 404 if result == 'Turf not found' else 400
+            return jsonify({'error': result}), status
+        booking = result
+
+        return jsonify({
+            'success': True,
+            'booking': booking,
+            'message': 'Booking confirmed successfully!'
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/cancel/<booking_id>', methods=['POST'])
+def cancel_booking(booking_id):
+    """Cancel a booking"""
+    try:
+        success = db.cancel_booking(booking_id)
+        if success:
+            return jsonify({
+                'success': True,
+                'message': 'Booking cancelled successfully'
+            })
+        else:
+            return jsonify({'error': 'Booking not found'}), 404
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/availability/<turf_id>/<date>', methods=['GET'])
+def check_availability(turf_id, date):
+    """Check availability for a specific date"""
+    try:
+        turf = db.get_turf_by_id(turf_id)
+        if not turf:
+            return jsonify({'error': 'Turf not found'}), 404
+        
+        booked_slots = db.get_booked_slots(turf_id, date)
+        available_slots = [slot for slot in turf['available_hours'] if slot not in booked_slots]
+
+        return jsonify({
+            'available_slots': available_slots,
+            'booked_slots': sorted(booked_slots),
+            'price_per_hour': turf['price_per_hour']
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+if __name__ == '__main__':
+    app.run(debug=True, host='0.0.0.0', port=5000)
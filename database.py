@@ -1,83 +1,279 @@
+import atexit
 import json
 import os
+import queue
+import threading
+from collections import defaultdict, deque
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+def _json_loads(raw: bytes) -> Dict:
+    """Deserialize JSON bytes, preferring orjson when available"""
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+# Journal flushing: events are batched so one fsync covers many writes.
+# A batch is flushed when it reaches FLUSH_BATCH_MAX events or when the
+# queue stays quiet for FLUSH_INTERVAL_SECONDS.
+FLUSH_INTERVAL_SECONDS = 0.05
+FLUSH_BATCH_MAX = 16
+
+def _json_dumps(obj, indent: bool = False) -> bytes:
+    """Serialize to JSON bytes, preferring orjson when available"""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None).encode("utf-8")
+
+# Seed data used by both database backends when no turfs exist yet
+DEFAULT_TURFS = [
+    {
+        "id": "turf_001",
+        "name": "Green Valley Sports Arena",
+        "location": "Downtown, Sector 21, Main Street",
+        "description": "Premium artificial turf with floodlights, perfect for football, cricket, and other sports",
+        "amenities": ["Floodlights", "Changing Rooms", "Parking", "Water Facility", "First Aid"],
+        "size": "100x60 feet",
+        "surface_type": "Artificial Grass",
+        "price_per_hour": 1500,
+        "available_hours": ["06:00", "07:00", "08:00", "09:00", "10:00", "11:00",
+                           "12:00", "13:00", "14:00", "15:00", "16:00", "17:00",
+                           "18:00", "19:00", "20:00", "21:00", "22:00"],
+        "images": ["turf1.jpg", "turf2.jpg"],
+        "rating": 4.5,
+        "total_reviews": 128
+    }
+]
+
 class TurfBookingDatabase:
     """Simple JSON-based database for turf bookings"""
     
-    def __init__(self, db_file: str = "bookings.json"):
+    def __init__(self, db_file: str = "bookings.json", sync_writes: bool = False):
         self.db_file = db_file
+        self.journal_file = os.path.splitext(db_file)[0] + ".jsonl"
+        # Reentrant so try_book can hold it across the availability
+        # check, ID allocation and insert as one atomic step.
+        self._lock = threading.RLock()
         self.data = self.load_data()
-    
+        self._rebuild_indexes()
+        # Bumped on every create/cancel; cheap change detection for callers
+        # that cache derived views of the bookings.
+        self.bookings_version = 0
+        # With sync_writes=False (default) journal events are drained by
+        # a background thread that batches them under one fsync, so
+        # request latency excludes disk sync; a crash can lose at most
+        # the last flush interval. Pass sync_writes=True to fsync inline
+        # when every write must be durable before it is acknowledged.
+        # The flusher is started lazily on first write and re-spawned per
+        # PID: threads don't survive fork, so a store created in a
+        # preloading gunicorn master would otherwise queue events in the
+        # worker with nothing draining them.
+        self.sync_writes = sync_writes
+        self._write_queue = queue.Queue()
+        self._flusher = None
+        self._flusher_pid = None
+        if not sync_writes:
+            atexit.register(self.flush_sync)
+
+    def _flusher_alive(self) -> bool:
+        """Whether a flusher thread is running in this process"""
+        return (
+            self._flusher is not None
+            and self._flusher_pid == os.getpid()
+            and self._flusher.is_alive()
+        )
+
+    def _ensure_flusher(self):
+        """Start (or restart after fork) the journal flush thread"""
+        with self._lock:
+            if self._flusher_alive():
+                return
+            if self._flusher is not None:
+                # A queue carried across fork still holds waiter state
+                # for the dead thread, so notifications from put() would
+                # wake a ghost instead of the new flusher. Move any
+                # pending events onto a fresh queue before restarting.
+                old_queue = self._write_queue
+                self._write_queue = queue.Queue()
+                while True:
+                    try:
+                        self._write_queue.put(old_queue.get_nowait())
+                    except queue.Empty:
+                        break
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher_pid = os.getpid()
+            self._flusher.start()
+
     def load_data(self) -> Dict:
-        """Load data from JSON file"""
+        """Load data from the JSON snapshot and replay the journal tail"""
         if os.path.exists(self.db_file):
-            with open(self.db_file, 'r') as f:
-                return json.load(f)
-        return {
-            "turfs": [],
-            "bookings": []
-        }
+            with open(self.db_file, 'rb') as f:
+                data = _json_loads(f.read())
+        else:
+            data = {
+                "turfs": [],
+                "bookings": []
+            }
+        self._replay_journal(data)
+        # Seed the booking ID counter past any IDs already on disk so
+        # cancelled/journal-replayed bookings can never cause collisions.
+        data.setdefault("next_booking_seq", 1)
+        for booking in data["bookings"]:
+            suffix = booking["booking_id"].lstrip("BK")
+            if suffix.isdigit():
+                data["next_booking_seq"] = max(data["next_booking_seq"], int(suffix) + 1)
+        return data
+
+    def _replay_journal(self, data: Dict):
+        """Apply journaled booking events on top of the snapshot"""
+        if not os.path.exists(self.journal_file):
+            return
+        by_id = {b["booking_id"]: b for b in data["bookings"]}
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                event = _json_loads(line)
+                if event["op"] == "create":
+                    booking = event["booking"]
+                    if booking["booking_id"] in by_id:
+                        continue
+                    data["bookings"].append(booking)
+                    by_id[booking["booking_id"]] = booking
+                elif event["op"] == "cancel":
+                    booking = by_id.get(event["booking_id"])
+                    if booking:
+                        booking["status"] = "cancelled"
+
+    def _rebuild_indexes(self):
+        """Build in-memory lookup indexes over turfs and bookings"""
+        self._turf_by_id = {turf["id"]: turf for turf in self.data["turfs"]}
+        self._booking_by_id = {}
+        # (turf_id, date) -> set of confirmed time slots
+        self._booked_slots = {}
+        # (turf_id, date) -> every booking for that turf and date,
+        # regardless of status; cancellations flip status in place
+        self._by_turf_date = defaultdict(list)
+        # Bounded ring of recently confirmed bookings, in creation order.
+        # Cancellations flip status in place (entries share the booking
+        # dicts), so readers skip anything no longer confirmed.
+        self._confirmed = deque(maxlen=1024)
+        for booking in self.data["bookings"]:
+            self._index_booking(booking)
+
+    def _index_booking(self, booking: Dict):
+        """Add a booking to the lookup indexes"""
+        self._booking_by_id[booking["booking_id"]] = booking
+        key = (booking["turf_id"], booking["date"])
+        self._by_turf_date[key].append(booking)
+        if booking["status"] == "confirmed":
+            self._booked_slots.setdefault(key, set()).add(booking["time_slot"])
+            self._confirmed.append(booking)
     
     def save_data(self):
-        """Save data to JSON file"""
-        with open(self.db_file, 'w') as f:
-            json.dump(self.data, f, indent=2)
+        """Write a full snapshot to the JSON file"""
+        with open(self.db_file, 'wb') as f:
+            f.write(_json_dumps(self.data, indent=True))
+
+    def _append_event(self, event: Dict):
+        """Queue a booking event for the journal (or write it inline)"""
+        if self.sync_writes:
+            self._write_events([event])
+        else:
+            self._ensure_flusher()
+            self._write_queue.put(event)
+
+    def _write_events(self, events: List[Dict]):
+        """Append a batch of events to the journal under a single fsync"""
+        with open(self.journal_file, 'ab') as f:
+            for event in events:
+                f.write(_json_dumps(event) + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _flush_loop(self):
+        """Drain queued events in batches; one fsync covers each batch"""
+        while True:
+            batch = [self._write_queue.get()]
+            try:
+                while len(batch) < FLUSH_BATCH_MAX:
+                    batch.append(self._write_queue.get(timeout=FLUSH_INTERVAL_SECONDS))
+            except queue.Empty:
+                pass
+            self._write_events(batch)
+            for _ in batch:
+                self._write_queue.task_done()
+
+    def flush_sync(self):
+        """Block until every queued journal event is durable on disk"""
+        if self.sync_writes:
+            return
+        if not self._flusher_alive():
+            # No thread to drain the queue (never started, or lost to a
+            # fork): flush whatever is pending inline instead of joining
+            # a queue nothing will ever finish.
+            batch = []
+            while True:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_events(batch)
+                for _ in batch:
+                    self._write_queue.task_done()
+            return
+        self._write_queue.join()
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot and truncate it"""
+        self.flush_sync()
+        self.save_data()
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'w'):
+                pass
     
     def initialize_dummy_turf(self):
         """Initialize dummy turf data"""
         if not self.data["turfs"]:
-            self.data["turfs"] = [
-                {
-                    "id": "turf_001",
-                    "name": "Green Valley Sports Arena",
-                    "location": "Downtown, Sector 21, Main Street",
-                    "description": "Premium artificial turf with floodlights, perfect for football, cricket, and other sports",
-                    "amenities": ["Floodlights", "Changing Rooms", "Parking", "Water Facility", "First Aid"],
-                    "size": "100x60 feet",
-                    "surface_type": "Artificial Grass",
-                    "price_per_hour": 1500,
-                    "available_hours": ["06:00", "07:00", "08:00", "09:00", "10:00", "11:00", 
-                                       "12:00", "13:00", "14:00", "15:00", "16:00", "17:00", 
-                                       "18:00", "19:00", "20:00", "21:00", "22:00"],
-                    "images": ["turf1.jpg", "turf2.jpg"],
-                    "rating": 4.5,
-                    "total_reviews": 128
-                }
-            ]
+            self.data["turfs"] = [dict(turf) for turf in DEFAULT_TURFS]
+            self._turf_by_id = {turf["id"]: turf for turf in self.data["turfs"]}
             self.save_data()
-    
+
     def get_all_turfs(self) -> List[Dict]:
         """Get all available turfs"""
         return self.data["turfs"]
-    
+
     def get_turf_by_id(self, turf_id: str) -> Optional[Dict]:
         """Get specific turf by ID"""
-        for turf in self.data["turfs"]:
-            if turf["id"] == turf_id:
-                return turf
-        return None
+        return self._turf_by_id.get(turf_id)
     
     def get_bookings_for_date(self, turf_id: str, date: str) -> List[Dict]:
         """Get all bookings for a specific turf and date"""
-        bookings = []
-        for booking in self.data["bookings"]:
-            if booking["turf_id"] == turf_id and booking["date"] == date:
-                bookings.append(booking)
-        return bookings
+        return self._by_turf_date.get((turf_id, date), [])
     
+    def get_booked_slots(self, turf_id: str, date: str) -> set:
+        """Get the set of confirmed time slots for a turf and date"""
+        return self._booked_slots.get((turf_id, date), set())
+
     def check_availability(self, turf_id: str, date: str, time_slot: str) -> bool:
         """Check if a time slot is available"""
-        bookings = self.get_bookings_for_date(turf_id, date)
-        for booking in bookings:
-            if booking["time_slot"] == time_slot and booking["status"] == "confirmed":
-                return False
-        return True
+        return time_slot not in self._booked_slots.get((turf_id, date), ())
     
+    def _next_booking_id(self) -> str:
+        """Allocate the next booking ID from the persistent counter"""
+        with self._lock:
+            seq = self.data["next_booking_seq"]
+            self.data["next_booking_seq"] += 1
+        return f"BK{seq:06d}"
+
     def create_booking(self, booking_data: Dict) -> Dict:
         """Create a new booking"""
-        booking_id = f"BK{len(self.data['bookings']) + 1:04d}"
+        booking_id = self._next_booking_id()
         booking = {
             "booking_id": booking_id,
             "turf_id": booking_data["turf_id"],
@@ -92,25 +288,57 @@ class TurfBookingDatabase:
             "total_amount": booking_data.get("total_amount", 0)
         }
         self.data["bookings"].append(booking)
-        self.save_data()
+        self._index_booking(booking)
+        self.bookings_version += 1
+        self._append_event({"op": "create", "booking": booking})
         return booking
-    
+
+    def try_book(self, booking_data: Dict):
+        """Validate, price and create a booking as one atomic step
+
+        Returns (True, booking) on success or (False, error_message) if
+        the turf doesn't exist or the slot is taken. Holding the lock
+        across the availability check and the insert means two
+        concurrent requests can't both book the same slot.
+        """
+        turf = self._turf_by_id.get(booking_data["turf_id"])
+        if turf is None:
+            return False, "Turf not found"
+        with self._lock:
+            key = (turf["id"], booking_data["date"])
+            if booking_data["time_slot"] in self._booked_slots.get(key, ()):
+                return False, "This time slot is already booked"
+            booking_data["total_amount"] = turf["price_per_hour"] * int(booking_data.get("duration", 1))
+            return True, self.create_booking(booking_data)
+
     def cancel_booking(self, booking_id: str) -> bool:
         """Cancel a booking"""
-        for booking in self.data["bookings"]:
-            if booking["booking_id"] == booking_id:
-                booking["status"] = "cancelled"
-                self.save_data()
-                return True
-        return False
-    
+        booking = self._booking_by_id.get(booking_id)
+        if booking is None:
+            return False
+        booking["status"] = "cancelled"
+        slots = self._booked_slots.get((booking["turf_id"], booking["date"]))
+        if slots:
+            slots.discard(booking["time_slot"])
+        self.bookings_version += 1
+        self._append_event({"op": "cancel", "booking_id": booking_id})
+        return True
+
     def get_booking_by_id(self, booking_id: str) -> Optional[Dict]:
         """Get booking by ID"""
-        for booking in self.data["bookings"]:
-            if booking["booking_id"] == booking_id:
-                return booking
-        return None
+        return self._booking_by_id.get(booking_id)
     
     def get_all_bookings(self) -> List[Dict]:
         """Get all bookings"""
         return self.data["bookings"]
+
+    def get_recent_confirmed_bookings(self, limit: int = 10) -> List[Dict]:
+        """Get the most recent confirmed bookings, oldest first"""
+        recent = []
+        for booking in reversed(self._confirmed):
+            if booking["status"] == "confirmed":
+                recent.append(booking)
+                if len(recent) == limit:
+                    break
+        recent.reverse()
+        return recent
@@ -0,0 +1,15 @@
+"""Gunicorn configuration for the turf booking app.
+
+Chat requests spend 1-3s blocked on Groq, so threads are what buys
+concurrency here. A single worker process is deliberate: chat sessions
+and the default JSON store live in process memory, and multiple workers
+would split sessions across processes. Scale threads first; move to
+TURF_DB_BACKEND=sqlite before adding workers.
+"""
+bind = "0.0.0.0:5000"
+workers = 1
+worker_class = "gthread"
+threads = 16
+preload_app = True
+timeout = 120
+keepalive = 5
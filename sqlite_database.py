@@ -0,0 +1,197 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Dict, Optional
+
+from database import DEFAULT_TURFS
+
+class SQLiteTurfBookingDatabase:
+    """SQLite-backed store with the same interface as TurfBookingDatabase
+
+    Uses WAL mode so readers never block on writers, a (turf_id, date,
+    status) index for the hot availability path, and parameterized
+    statements throughout. Opt in by setting TURF_DB_BACKEND=sqlite.
+    """
+
+    def __init__(self, db_file: str = "bookings.db"):
+        self.db_file = db_file
+        # Reentrant so try_book can hold it across the availability
+        # check, ID allocation and insert as one atomic step.
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        self.bookings_version = 0
+
+    def _create_schema(self):
+        """Create tables and indexes if they don't exist yet"""
+        with self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS turfs (
+                    id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS bookings (
+                    booking_id TEXT PRIMARY KEY,
+                    turf_id TEXT NOT NULL,
+                    customer_name TEXT NOT NULL,
+                    customer_phone TEXT NOT NULL,
+                    customer_email TEXT NOT NULL DEFAULT '',
+                    date TEXT NOT NULL,
+                    time_slot TEXT NOT NULL,
+                    duration INTEGER NOT NULL DEFAULT 1,
+                    status TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    total_amount INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_bookings_turf_date
+                    ON bookings(turf_id, date, status);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+            """)
+            self._conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('next_booking_seq', 1)"
+            )
+
+    def initialize_dummy_turf(self):
+        """Initialize dummy turf data"""
+        count = self._conn.execute("SELECT COUNT(*) FROM turfs").fetchone()[0]
+        if count == 0:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO turfs (id, data) VALUES (?, ?)",
+                    [(turf["id"], json.dumps(turf)) for turf in DEFAULT_TURFS]
+                )
+
+    def get_all_turfs(self) -> List[Dict]:
+        """Get all available turfs"""
+        rows = self._conn.execute("SELECT data FROM turfs ORDER BY id").fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def get_turf_by_id(self, turf_id: str) -> Optional[Dict]:
+        """Get specific turf by ID"""
+        row = self._conn.execute(
+            "SELECT data FROM turfs WHERE id = ?", (turf_id,)
+        ).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def get_bookings_for_date(self, turf_id: str, date: str) -> List[Dict]:
+        """Get all bookings for a specific turf and date"""
+        rows = self._conn.execute(
+            "SELECT * FROM bookings WHERE turf_id = ? AND date = ?",
+            (turf_id, date)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_booked_slots(self, turf_id: str, date: str) -> set:
+        """Get the set of confirmed time slots for a turf and date"""
+        rows = self._conn.execute(
+            "SELECT time_slot FROM bookings "
+            "WHERE turf_id = ? AND date = ? AND status = 'confirmed'",
+            (turf_id, date)
+        ).fetchall()
+        return {row["time_slot"] for row in rows}
+
+    def check_availability(self, turf_id: str, date: str, time_slot: str) -> bool:
+        """Check if a time slot is available"""
+        row = self._conn.execute(
+            "SELECT 1 FROM bookings "
+            "WHERE turf_id = ? AND date = ? AND time_slot = ? AND status = 'confirmed' "
+            "LIMIT 1",
+            (turf_id, date, time_slot)
+        ).fetchone()
+        return row is None
+
+    def _next_booking_id(self) -> str:
+        """Allocate the next booking ID from the persistent counter"""
+        with self._lock, self._conn:
+            seq = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'next_booking_seq'"
+            ).fetchone()[0]
+            self._conn.execute(
+                "UPDATE meta SET value = value + 1 WHERE key = 'next_booking_seq'"
+            )
+        return f"BK{seq:06d}"
+
+    def create_booking(self, booking_data: Dict) -> Dict:
+        """Create a new booking"""
+        booking = {
+            "booking_id": self._next_booking_id(),
+            "turf_id": booking_data["turf_id"],
+            "customer_name": booking_data["customer_name"],
+            "customer_phone": booking_data["customer_phone"],
+            "customer_email": booking_data.get("customer_email", ""),
+            "date": booking_data["date"],
+            "time_slot": booking_data["time_slot"],
+            "duration": booking_data.get("duration", 1),
+            "status": "confirmed",
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "total_amount": booking_data.get("total_amount", 0)
+        }
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO bookings (booking_id, turf_id, customer_name, "
+                "customer_phone, customer_email, date, time_slot, duration, "
+                "status, created_at, total_amount) "
+                "VALUES (:booking_id, :turf_id, :customer_name, :customer_phone, "
+                ":customer_email, :date, :time_slot, :duration, :status, "
+                ":created_at, :total_amount)",
+                booking
+            )
+        self.bookings_version += 1
+        return booking
+
+    def try_book(self, booking_data: Dict):
+        """Validate, price and create a booking as one atomic step
+
+        Returns (True, booking) on success or (False, error_message) if
+        the turf doesn't exist or the slot is taken.
+        """
+        turf = self.get_turf_by_id(booking_data["turf_id"])
+        if turf is None:
+            return False, "Turf not found"
+        with self._lock:
+            if not self.check_availability(
+                booking_data["turf_id"], booking_data["date"], booking_data["time_slot"]
+            ):
+                return False, "This time slot is already booked"
+            booking_data["total_amount"] = turf["price_per_hour"] * int(booking_data.get("duration", 1))
+            return True, self.create_booking(booking_data)
+
+    def cancel_booking(self, booking_id: str) -> bool:
+        """Cancel a booking"""
+        with self._conn:
+            cursor = self._conn.execute(
+                "UPDATE bookings SET status = 'cancelled' WHERE booking_id = ?",
+                (booking_id,)
+            )
+        if cursor.rowcount == 0:
+            return False
+        self.bookings_version += 1
+        return True
+
+    def get_booking_by_id(self, booking_id: str) -> Optional[Dict]:
+        """Get booking by ID"""
+        row = self._conn.execute(
+            "SELECT * FROM bookings WHERE booking_id = ?", (booking_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def get_all_bookings(self) -> List[Dict]:
+        """Get all bookings"""
+        rows = self._conn.execute("SELECT * FROM bookings").fetchall()
+        return [dict(row) for row in rows]
+
+    def get_recent_confirmed_bookings(self, limit: int = 10) -> List[Dict]:
+        """Get the most recent confirmed bookings, oldest first"""
+        rows = self._conn.execute(
+            "SELECT * FROM bookings WHERE status = 'confirmed' "
+            "ORDER BY rowid DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [dict(row) for row in reversed(rows)]